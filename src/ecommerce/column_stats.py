@@ -0,0 +1,323 @@
+import hashlib
+import json
+import math
+import random
+from collections import Counter
+from datetime import datetime
+
+# Distinct values are counted exactly up to this many, then by HyperLogLog
+EXACT_DISTINCT_LIMIT = 1024
+RESERVOIR_SIZE = 100
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch with 2**precision registers."""
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        x = int.from_bytes(
+            hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "big"
+        )
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # small range correction (linear counting)
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+class DistinctCounter:
+    """Exact distinct count for small columns, HyperLogLog once it grows."""
+
+    def __init__(self):
+        self.values = set()
+        self.sketch = None
+
+    @property
+    def exact(self):
+        return self.sketch is None
+
+    def add(self, value):
+        if self.sketch is not None:
+            self.sketch.add(value)
+            return
+        self.values.add(value)
+        if len(self.values) > EXACT_DISTINCT_LIMIT:
+            self.sketch = HyperLogLog()
+            for v in self.values:
+                self.sketch.add(v)
+            self.values = None
+
+    def estimate(self):
+        return len(self.values) if self.sketch is None else self.sketch.estimate()
+
+
+class ColumnProfile:
+    """Running null count, distinct count, min/max and string length histogram."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.null_count = 0
+        self.distinct = DistinctCounter()
+        self.min_value = None
+        self.max_value = None
+        self.comparable = True
+        self.length_histogram = Counter()
+
+    def add(self, value):
+        self.count += 1
+        if value is None:
+            self.null_count += 1
+            return
+        self.distinct.add(value)
+        if isinstance(value, str):
+            self.length_histogram[len(value)] += 1
+        if self.comparable:
+            try:
+                if self.min_value is None or value < self.min_value:
+                    self.min_value = value
+                if self.max_value is None or value > self.max_value:
+                    self.max_value = value
+            except TypeError:
+                # mixed types in one column, min/max are meaningless
+                self.comparable = False
+                self.min_value = self.max_value = None
+
+    @property
+    def non_null_count(self):
+        return self.count - self.null_count
+
+    @property
+    def all_strings(self):
+        return sum(self.length_histogram.values()) == self.non_null_count
+
+
+class TableStats:
+    """Column profiles and a reservoir sample of the rows written to one table."""
+
+    def __init__(self, table_name, columns, table_columns=None, seed=None):
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.table_columns = list(table_columns or columns)
+        self.row_count = 0
+        self.profiles = {column: ColumnProfile(column) for column in self.columns}
+        self.sample = []
+        # set when the table already held rows the stats never saw
+        self.partial = False
+        self._random = random.Random(seed)
+
+    def observe(self, rows):
+        """
+        Profile rows as they stream past, yielding them unchanged.
+
+        Args:
+            rows: Iterable of row tuples in ``columns`` order
+
+        Yields:
+            tuple: Each input row
+        """
+        profiles = [self.profiles[column] for column in self.columns]
+        for row in rows:
+            self.row_count += 1
+            for profile, value in zip(profiles, row):
+                profile.add(value)
+            if len(self.sample) < RESERVOIR_SIZE:
+                self.sample.append(row)
+            else:
+                i = self._random.randrange(self.row_count)
+                if i < RESERVOIR_SIZE:
+                    self.sample[i] = row
+            yield row
+
+
+class RunStats:
+    """Per-table stats collected during the write stage of one ETL run."""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        self.tables = {}
+
+    def start_table(self, table_name, columns, table_columns=None):
+        self.tables[table_name] = TableStats(table_name, columns, table_columns)
+        return self.tables[table_name]
+
+    def get(self, table_name):
+        return self.tables.get(table_name)
+
+    def save(self, db_cursor, table_name=None):
+        """Persist the stats of this run, or of one of its tables, into dq_column_stats."""
+        tables = [self.tables[table_name]] if table_name else self.tables.values()
+        db_cursor.executemany(
+            """
+            INSERT INTO dq_column_stats (run_id, table_name, column_name, row_count, null_count, distinct_estimate, distinct_exact, min_value, max_value, length_histogram, sample, etl_inserted)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'));
+            """,
+            [
+                (
+                    self.run_id,
+                    table.table_name,
+                    column,
+                    table.row_count,
+                    profile.null_count,
+                    profile.distinct.estimate(),
+                    profile.distinct.exact,
+                    profile.min_value,
+                    profile.max_value,
+                    json.dumps(dict(sorted(profile.length_histogram.items()))) if profile.length_histogram else None,
+                    json.dumps([row[i] for row in table.sample], default=str),
+                )
+                for table in tables
+                for i, (column, profile) in enumerate(table.profiles.items())
+            ],
+        )
+
+
+# kwargs that never change whether an expectation succeeds
+GENERIC_KWARGS = {"result_format", "include_config", "catch_exceptions", "batch_id"}
+
+# kwargs the stats can honour, per supported expectation type; any other
+# kwarg (row_condition, parse_strings_as_datetimes, ...) means GX has to run
+SUPPORTED_KWARGS = {
+    "expect_table_row_count_to_be_between": {"min_value", "max_value"},
+    "expect_table_row_count_to_equal": {"value"},
+    "expect_table_columns_to_match_ordered_list": {"column_list"},
+    "expect_column_values_to_not_be_null": {"column", "mostly"},
+    "expect_column_values_to_be_unique": {"column"},
+    "expect_column_min_to_be_between": {"column", "min_value", "max_value", "strict_min", "strict_max"},
+    "expect_column_max_to_be_between": {"column", "min_value", "max_value", "strict_min", "strict_max"},
+    "expect_column_value_lengths_to_be_between": {"column", "min_value", "max_value", "mostly"},
+}
+
+
+def _between(value, min_value=None, max_value=None, strict_min=False, strict_max=False):
+    if min_value is not None and (value <= min_value if strict_min else value < min_value):
+        return False
+    if max_value is not None and (value >= max_value if strict_max else value > max_value):
+        return False
+    return True
+
+
+def _answerable_kwargs(expectation_type, kwargs):
+    allowed = SUPPORTED_KWARGS.get(expectation_type)
+    if allowed is None or not set(kwargs) <= allowed | GENERIC_KWARGS:
+        return False
+    # evaluation parameters ({"$PARAMETER": ...}) are only resolved by GX
+    if any(isinstance(kwargs[k], dict) for k in allowed & set(kwargs)):
+        return False
+    mostly = kwargs.get("mostly", 1)
+    if isinstance(mostly, bool) or not isinstance(mostly, (int, float)) or not 0 <= mostly <= 1:
+        return False
+    if "min_value" in allowed and kwargs.get("min_value") is None and kwargs.get("max_value") is None:
+        return False
+    return True
+
+
+def _evaluate(expectation_type, kwargs, table_stats):
+    bounds = {k: kwargs.get(k) for k in ("min_value", "max_value")}
+    strict = {k: bool(kwargs.get(k, False)) for k in ("strict_min", "strict_max")}
+
+    if expectation_type == "expect_table_row_count_to_be_between":
+        return _between(table_stats.row_count, **bounds), table_stats.row_count
+    if expectation_type == "expect_table_row_count_to_equal":
+        return table_stats.row_count == kwargs.get("value"), table_stats.row_count
+    if expectation_type == "expect_table_columns_to_match_ordered_list":
+        return table_stats.table_columns == list(kwargs.get("column_list") or []), table_stats.table_columns
+
+    profile = table_stats.profiles.get(kwargs.get("column"))
+    if profile is None:
+        return None
+    mostly = kwargs.get("mostly", 1)
+
+    if expectation_type == "expect_column_values_to_not_be_null":
+        if not profile.count:
+            return True, 0
+        return profile.non_null_count / profile.count >= mostly, profile.null_count
+    if expectation_type == "expect_column_values_to_be_unique":
+        if not profile.distinct.exact:
+            return None
+        distinct = profile.distinct.estimate()
+        return distinct == profile.non_null_count, profile.non_null_count - distinct
+    if expectation_type in ("expect_column_min_to_be_between", "expect_column_max_to_be_between"):
+        value = profile.min_value if expectation_type == "expect_column_min_to_be_between" else profile.max_value
+        if not profile.comparable or value is None:
+            return None
+        return _between(value, **bounds, **strict), value
+    if expectation_type == "expect_column_value_lengths_to_be_between":
+        if not profile.all_strings:
+            return None
+        lengths = profile.length_histogram
+        if not profile.non_null_count:
+            return True, {}
+        passing = sum(count for length, count in lengths.items() if _between(length, **bounds))
+        return passing / profile.non_null_count >= mostly, dict(lengths)
+    return None
+
+
+def evaluate_expectation(expectation, table_stats):
+    """
+    Answer one expectation from collected stats.
+
+    Only the expectation types and kwargs in SUPPORTED_KWARGS are answered;
+    anything else is left to GX so the result can never differ from it.
+
+    Returns:
+        tuple: (success, observed_value), or None if the stats cannot answer it
+    """
+    expectation_type = expectation.get("expectation_type")
+    kwargs = expectation.get("kwargs", {})
+    if not _answerable_kwargs(expectation_type, kwargs):
+        return None
+    try:
+        return _evaluate(expectation_type, kwargs, table_stats)
+    except TypeError:
+        # bounds of another type than the column values, e.g. a string min on an INTEGER column
+        return None
+
+
+def validate_from_stats(suite, table_stats):
+    """
+    Validate a compiled suite against collected stats, without touching the table.
+
+    Returns:
+        list: Validation results shaped like GX ``list_validation_results()``,
+        or None if any expectation in the suite needs a real GX validation
+    """
+    if table_stats.partial:
+        return None
+
+    results = []
+    for expectation in suite.expectations:
+        answer = evaluate_expectation(expectation, table_stats)
+        if answer is None:
+            return None
+        success, observed_value = answer
+        results.append(
+            {
+                "success": success,
+                "expectation_config": expectation,
+                "result": {"observed_value": observed_value},
+            }
+        )
+    return [
+        {
+            "success": all(result["success"] for result in results),
+            "results": results,
+            "meta": {
+                "expectation_suite_name": suite.name,
+                "source": "column_stats",
+            },
+        }
+    ]
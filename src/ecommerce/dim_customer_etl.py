@@ -1,19 +1,59 @@
+import argparse
 import sys
 from pathlib import Path
 
 import sqlite3
 import great_expectations as gx
 
-def write_non_validated_base_state(db_cursor):
-    db_cursor.execute(
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.ecommerce.column_stats import RunStats, validate_from_stats
+from src.ecommerce.reference_cache import ReferenceCache, content_hash, published_version, set_published_version
+from src.ecommerce.suite_registry import SuiteRegistry
+
+suite_registry = SuiteRegistry()
+reference_cache = ReferenceCache()
+
+STATE_COLUMNS = ("state_id", "state_code", "state_name")
+
+def start_table_stats(db_cursor, stats, table_name, columns):
+    table_columns = [row[1] for row in db_cursor.execute(f"PRAGMA table_info({table_name})")]
+    table_stats = stats.start_table(table_name, columns, table_columns)
+    # run() clears staging before each write, but a direct caller may not;
+    # rows the stats never saw mean audits must not trust them
+    table_stats.partial = db_cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name})").fetchone()[0] == 1
+    return table_stats
+
+def insert_select(db_cursor, table_name, columns, query, stats=None):
+    # with stats, rows are streamed through Python so they are profiled in the same pass
+    column_list = ", ".join(columns)
+    if stats is None:
+        db_cursor.execute(f"INSERT INTO {table_name} ({column_list}) {query}")
+        return
+    table_stats = start_table_stats(db_cursor, stats, table_name, columns)
+    placeholders = ", ".join("?" for _ in columns)
+    db_cursor.executemany(
+        f"INSERT INTO {table_name} ({column_list}) VALUES ({placeholders})",
+        table_stats.observe(db_cursor.connection.execute(query)),
+    )
+
+def save_table_stats(db_cursor, stats, table_name):
+    # saved right after the write, so runs that fail an audit keep their stats too
+    if stats is not None:
+        stats.save(db_cursor, table_name)
+
+def write_non_validated_base_state(db_cursor, stats=None):
+    insert_select(
+        db_cursor,
+        'non_validated_base_state',
+        ('state_id', 'state_code', 'state_name'),
         """
-        INSERT INTO non_validated_base_state (state_id, state_code, state_name)
         SELECT
             CAST(state_id AS INTEGER) AS state_id,
             CAST(state_code AS TEXT) AS state_code,
             CAST(state_name AS TEXT) AS state_name
         FROM raw_state
-        """
+        """,
+        stats,
     )
 
 def publish_base_state(db_cursor):
@@ -30,10 +70,12 @@ def publish_base_state(db_cursor):
         """
     )   
 
-def write_non_validated_base_customer(db_cursor):
-    db_cursor.execute(
+def write_non_validated_base_customer(db_cursor, stats=None):
+    insert_select(
+        db_cursor,
+        'non_validated_base_customer',
+        ('customer_id', 'zipcode', 'city', 'state_code', 'datetime_created', 'datetime_updated'),
         """
-        INSERT INTO non_validated_base_customer (customer_id, zipcode, city, state_code, datetime_created, datetime_updated)
         SELECT
             customer_id,
             zipcode,
@@ -41,8 +83,9 @@ def write_non_validated_base_customer(db_cursor):
             state_code,
             datetime_created AS datetime_created,
             datetime_updated AS datetime_updated
-        FROM raw_customer;
-        """
+        FROM raw_customer
+        """,
+        stats,
     )
 
 def publish_base_customer(db_cursor):
@@ -62,22 +105,68 @@ def publish_base_customer(db_cursor):
         """
     )
 
-def write_non_validated_dim_customer(db_cursor):
+def load_state_names(db_cursor):
+    # base_state is versioned by the content hash recorded when it was last published
+    version = published_version(db_cursor, 'base_state')[1] or content_hash(db_cursor, 'base_state', STATE_COLUMNS)
+    return reference_cache.lookup(db_cursor, 'base_state', 'state_code', 'state_name', version)
+
+def unknown_state_codes(db_cursor, state_names):
+    # state codes of the staged customers that the dim_customer join would drop
     db_cursor.execute(
         """
-        INSERT INTO non_validated_dim_customer (customer_id, zipcode, city, state_code, state_name, datetime_created, datetime_updated)
-        SELECT DISTINCT
-            c.customer_id,
-            c.zipcode,
-            c.city,
-            c.state_code,
-            s.state_name,
-            c.datetime_created,
-            c.datetime_updated
-        FROM base_customer AS c
-        INNER JOIN base_state AS s ON c.state_code = s.state_code;
+        SELECT state_code, COUNT(*)
+        FROM non_validated_base_customer
+        GROUP BY state_code;
+        """
+    )
+    return {state_code: count for state_code, count in db_cursor.fetchall() if state_code not in state_names}
+
+def write_non_validated_dim_customer(db_cursor, state_names=None, stats=None):
+    if stats is None:
+        db_cursor.execute(
+            """
+            INSERT INTO non_validated_dim_customer (customer_id, zipcode, city, state_code, state_name, datetime_created, datetime_updated)
+            SELECT DISTINCT
+                c.customer_id,
+                c.zipcode,
+                c.city,
+                c.state_code,
+                s.state_name,
+                c.datetime_created,
+                c.datetime_updated
+            FROM base_customer AS c
+            INNER JOIN base_state AS s ON c.state_code = s.state_code;
+            """
+        )
+        return
+
+    # with stats, rows are streamed through Python so they are profiled in the
+    # same pass, and state_name comes from the cached base_state map
+    if state_names is None:
+        state_names = load_state_names(db_cursor)
+    customers = db_cursor.connection.execute(
+        """
+        SELECT DISTINCT customer_id, zipcode, city, state_code, datetime_created, datetime_updated
+        FROM base_customer;
         """
     )
+    rows = start_table_stats(
+        db_cursor,
+        stats,
+        'non_validated_dim_customer',
+        ('customer_id', 'zipcode', 'city', 'state_code', 'state_name', 'datetime_created', 'datetime_updated'),
+    ).observe(
+        (customer_id, zipcode, city, state_code, state_names[state_code], datetime_created, datetime_updated)
+        for customer_id, zipcode, city, state_code, datetime_created, datetime_updated in customers
+        if state_code in state_names
+    )
+    db_cursor.executemany(
+        """
+        INSERT INTO non_validated_dim_customer (customer_id, zipcode, city, state_code, state_name, datetime_created, datetime_updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?);
+        """,
+        rows,
+    )
 
 def publish_dim_customer(db_cursor):
     db_cursor.execute(
@@ -98,27 +187,31 @@ def publish_dim_customer(db_cursor):
     )
     pass
 
-def audit(expectation_suite_to_check):
-    context_root_dir = Path.cwd() / "ecommerce" / "ecommerce" / "gx"
-    expc_json_path = context_root_dir / "expectations" / f"{expectation_suite_to_check}.json"
-    file_path = Path(expc_json_path)
-
-    if file_path.exists():
-        # validate
-        context = gx.get_context(
-            context_root_dir=context_root_dir)
-        validations = []
-        validations.append(
-            {
-                "batch_request": context.get_datasource("ecommerce_db").get_asset(expectation_suite_to_check).build_batch_request(),
-                "expectation_suite_name": expectation_suite_to_check,
-            }
-        )
-        return context.run_checkpoint(
-            checkpoint_name="dq_checkpoint", validations=validations
-        ).list_validation_results()
-    else:
-        return None 
+def audit(expectation_suite_to_check, stats=None):
+    # raises SuiteNotFoundError: a missing suite must not pass the audit
+    suite = suite_registry.get(expectation_suite_to_check)
+
+    # suites made only of cheap expectations are answered from the write-stage stats
+    table_stats = stats.get(suite.asset) if stats is not None else None
+    if table_stats is not None:
+        validation_results = validate_from_stats(suite, table_stats)
+        if validation_results is not None:
+            # no checkpoint runs, so GX stores no validation result or Data Docs for it
+            print(f"======== {suite.name} answered from column stats, not stored in GX ==========")
+            return validation_results
+
+    context = gx.get_context(
+        context_root_dir=suite_registry.context_root_dir)
+    validations = []
+    validations.append(
+        {
+            "batch_request": context.get_datasource("ecommerce_db").get_asset(suite.asset).build_batch_request(),
+            "expectation_suite_name": suite.name,
+        }
+    )
+    return context.run_checkpoint(
+        checkpoint_name="dq_checkpoint", validations=validations
+    ).list_validation_results()
 
 def check_audit_failures(validation_results):
     if not validation_results:
@@ -135,14 +228,20 @@ def check_audit_failures(validation_results):
                 print(result)
     return all(results) 
 
-def run():
+def run(collect_stats=False):
     conn = sqlite3.connect('data/ecommerce.db')
     db_cursor = conn.cursor()
+    stats = RunStats() if collect_stats else None
 
     # NOTE: WRITE -> AUDIT -> PUBLISH pattern
-    write_non_validated_base_customer(db_cursor)
+    # staged rows are committed before each audit, so rows left behind by a
+    # failed run are cleared before writing the new batch
+    db_cursor.execute("DELETE FROM non_validated_base_customer;")
+    write_non_validated_base_customer(db_cursor, stats)
+    save_table_stats(db_cursor, stats, 'non_validated_base_customer')
+    conn.commit()
 
-    base_customer_validation_result = audit('non_validated_base_customer')
+    base_customer_validation_result = audit('non_validated_base_customer', stats)
     if check_audit_failures(base_customer_validation_result ):
         publish_base_customer(db_cursor)
     else:
@@ -150,19 +249,37 @@ def run():
         print(base_customer_validation_result)
         sys.exit(1)
 
-    write_non_validated_base_state(db_cursor)
-    base_state_validation_result = audit('non_validated_base_state')
-    if check_audit_failures(base_state_validation_result):
-        publish_base_state(db_cursor)
+    # base_state is versioned by the raw_state content it was last published
+    # from, and only goes through write -> audit -> publish when that changed
+    source_hash = content_hash(db_cursor, 'raw_state', STATE_COLUMNS)
+    if source_hash != published_version(db_cursor, 'base_state')[0]:
+        db_cursor.execute("DELETE FROM non_validated_base_state;")
+        write_non_validated_base_state(db_cursor, stats)
+        save_table_stats(db_cursor, stats, 'non_validated_base_state')
+        conn.commit()
+        base_state_validation_result = audit('non_validated_base_state', stats)
+        if check_audit_failures(base_state_validation_result):
+            publish_base_state(db_cursor)
+            set_published_version(db_cursor, 'base_state', source_hash, content_hash(db_cursor, 'base_state', STATE_COLUMNS))
+        else:
+            print("======== base_state DQ check failed ==========")
+            print(base_state_validation_result)
+            sys.exit(1)
     else:
-        print("======== base_state DQ check failed ==========")
-        print(base_state_validation_result)
-        sys.exit(1)
+        print("======== base_state unchanged, skipping audit and publish ==========")
 
-    write_non_validated_dim_customer(db_cursor)
+    state_names = load_state_names(db_cursor)
+    unknown_codes = unknown_state_codes(db_cursor, state_names)
+    if unknown_codes:
+        print("================THIS IS A WARNING DQ ISSUE==================")
+        print(f"customers with a state_code missing from base_state are left out of dim_customer: {unknown_codes}")
+
+    db_cursor.execute("DELETE FROM non_validated_dim_customer;")
+    write_non_validated_dim_customer(db_cursor, state_names, stats=stats)
+    save_table_stats(db_cursor, stats, 'non_validated_dim_customer')
     conn.commit()
 
-    dim_customer_validation_result = audit('non_validated_dim_customer')
+    dim_customer_validation_result = audit('non_validated_dim_customer', stats)
     dim_customer_count_anomaly = audit('dim_customer_dt_created_count')
     if check_audit_failures(dim_customer_validation_result) and check_audit_failures(dim_customer_count_anomaly):
         publish_dim_customer(db_cursor)
@@ -181,4 +298,7 @@ def run():
     conn.close()
 
 if __name__ == '__main__':
-    run()
+    parser = argparse.ArgumentParser(description="Run the dim_customer ETL.")
+    parser.add_argument("--stats", action="store_true", help="Profile columns during the write stage and store the stats in dq_column_stats")
+    args = parser.parse_args()
+    run(collect_stats=args.stats)
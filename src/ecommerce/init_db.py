@@ -102,6 +102,32 @@ def init_db():
         )
     """)
     
+    db_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS etl_reference_version (
+            table_name TEXT PRIMARY KEY,
+            source_hash TEXT,
+            content_hash TEXT,
+            etl_inserted DATETIME
+        )
+    """)
+    
+    db_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dq_column_stats (
+            run_id TEXT,
+            table_name TEXT,
+            column_name TEXT,
+            row_count INTEGER,
+            null_count INTEGER,
+            distinct_estimate INTEGER,
+            distinct_exact BOOLEAN,
+            min_value,
+            max_value,
+            length_histogram TEXT,
+            sample TEXT,
+            etl_inserted DATETIME
+        )
+    """)
+    
     # Insert sample data
     db_cursor.execute("""
         INSERT INTO raw_state (state_id, state_code, state_name)
@@ -0,0 +1,163 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import sqlite3
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.ecommerce.dim_customer_etl import (
+    publish_base_customer,
+    publish_base_state,
+    write_non_validated_base_customer,
+    write_non_validated_base_state,
+    write_non_validated_dim_customer,
+)
+from src.ecommerce.suite_registry import SuiteRegistry
+
+GX_VERSION = "0.18.19"
+
+# Columns filled in by the publish step only, so they are always NULL in staging
+SKIPPED_COLUMNS = {"etl_inserted"}
+
+
+def stage_sample(db_cursor, sample_size):
+    """
+    Fill every non_validated_* table from a random sample of raw_customer.
+
+    raw_customer is cut down to ``sample_size`` random rows before running the
+    same write/publish steps as the ETL; raw_state is a small reference table
+    and is staged whole. The cursor must belong to a throwaway copy of the
+    database, never to the live one.
+    """
+    db_cursor.execute(
+        "DELETE FROM raw_customer WHERE rowid NOT IN (SELECT rowid FROM raw_customer ORDER BY random() LIMIT ?)",
+        (sample_size,),
+    )
+    write_non_validated_base_customer(db_cursor)
+    write_non_validated_base_state(db_cursor)
+    publish_base_customer(db_cursor)
+    publish_base_state(db_cursor)
+    write_non_validated_dim_customer(db_cursor)
+
+
+def expectation(expectation_type, level, **kwargs):
+    return {
+        "expectation_type": expectation_type,
+        "kwargs": kwargs,
+        "meta": {"level": level, "profiler": "baseline"},
+    }
+
+
+def profile_table(db_cursor, table_name, sample_size):
+    """
+    Build a baseline expectation suite from a sample of one table.
+
+    Structural checks (column list, non-empty table) are ERROR level. Checks
+    inferred from the sample values are WARN level until someone reviews them.
+
+    Args:
+        db_cursor: SQLite cursor
+        table_name: Table to profile
+        sample_size: Number of rows randomly sampled from the table
+
+    Returns:
+        dict: Expectation suite in GX JSON format, or None if the sample is empty
+    """
+    # base_customer can hold earlier runs, so the staged tables are sampled too
+    db_cursor.execute(f"SELECT * FROM {table_name} ORDER BY random() LIMIT ?", (sample_size,))
+    columns = [d[0] for d in db_cursor.description]
+    rows = db_cursor.fetchall()
+    if not rows:
+        return None
+
+    expectations = [
+        expectation("expect_table_columns_to_match_ordered_list", "ERROR", column_list=columns),
+        expectation("expect_table_row_count_to_be_between", "ERROR", min_value=1),
+    ]
+    for i, column in enumerate(columns):
+        if column in SKIPPED_COLUMNS:
+            continue
+        values = [row[i] for row in rows]
+        non_null = [v for v in values if v is not None]
+        if not non_null:
+            continue
+        if len(non_null) == len(values):
+            expectations.append(
+                expectation("expect_column_values_to_not_be_null", "WARN", column=column)
+            )
+        if column.endswith("_id") and len(set(non_null)) == len(non_null):
+            expectations.append(
+                expectation("expect_column_values_to_be_unique", "WARN", column=column)
+            )
+
+    return {
+        "data_asset_type": None,
+        "expectation_suite_name": table_name,
+        "expectations": expectations,
+        "ge_cloud_id": None,
+        "meta": {"great_expectations_version": GX_VERSION},
+    }
+
+
+def profile_suites(db_path, registry, sample_size=1000, overwrite=False):
+    """
+    Write a baseline suite for every non_validated_* table in one pass.
+
+    Tables that already have a suite are left alone unless overwrite is set.
+
+    Returns:
+        list: Names of the suites that were written
+    """
+    # sample in an in-memory copy so the live database is only read
+    source = sqlite3.connect(db_path)
+    conn = sqlite3.connect(":memory:")
+    try:
+        source.backup(conn)
+    finally:
+        source.close()
+
+    db_cursor = conn.cursor()
+    written = []
+    try:
+        stage_sample(db_cursor, sample_size)
+        db_cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'non\\_validated\\_%' ESCAPE '\\' ORDER BY name"
+        )
+        for (table_name,) in db_cursor.fetchall():
+            if table_name in registry and not overwrite:
+                print(f"Skipping {table_name}: suite already exists")
+                continue
+            suite = profile_table(db_cursor, table_name, sample_size)
+            if suite is None:
+                print(f"Skipping {table_name}: no rows to sample")
+                continue
+            suite_path = registry.expectations_dir / f"{table_name}.json"
+            with open(suite_path, "w") as f:
+                json.dump(suite, f, indent=2)
+                f.write("\n")
+            written.append(table_name)
+            print(f"Wrote {suite_path}")
+    finally:
+        conn.close()
+
+    registry.refresh()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate baseline expectation suites for every non_validated_* table."
+    )
+    parser.add_argument("--db", default="data/ecommerce.db", help="SQLite database to sample")
+    parser.add_argument("--context-root-dir", default=None, help="GX context root (defaults to src/ecommerce/gx)")
+    parser.add_argument("--sample-size", type=int, default=1000, help="Rows randomly sampled from raw_customer and from each non_validated_* table")
+    parser.add_argument("--overwrite", action="store_true", help="Regenerate suites that already exist")
+    args = parser.parse_args(argv)
+
+    registry = SuiteRegistry(args.context_root_dir)
+    profile_suites(args.db, registry, sample_size=args.sample_size, overwrite=args.overwrite)
+
+
+if __name__ == '__main__':
+    main()
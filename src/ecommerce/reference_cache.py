@@ -0,0 +1,90 @@
+import hashlib
+
+
+def content_hash(db_cursor, table_name, columns):
+    """
+    Hash the contents of a table, independent of physical row order.
+
+    Args:
+        db_cursor: SQLite cursor
+        table_name: Table to hash
+        columns: Columns that make up the table's content
+
+    Returns:
+        str: Hex sha256 digest of the ordered rows
+    """
+    column_list = ", ".join(columns)
+    digest = hashlib.sha256(column_list.encode())
+    for row in db_cursor.execute(
+        f"SELECT {column_list} FROM {table_name} ORDER BY {column_list}"
+    ):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def published_version(db_cursor, table_name):
+    """
+    Return the versions recorded at the last publish of a reference table.
+
+    Returns:
+        tuple: (source_hash, content_hash), or (None, None) if never published
+    """
+    row = db_cursor.execute(
+        "SELECT source_hash, content_hash FROM etl_reference_version WHERE table_name = ?",
+        (table_name,),
+    ).fetchone()
+    return row if row else (None, None)
+
+
+def set_published_version(db_cursor, table_name, source_hash, table_hash):
+    db_cursor.execute(
+        """
+        INSERT OR REPLACE INTO etl_reference_version (table_name, source_hash, content_hash, etl_inserted)
+        VALUES (?, ?, ?, datetime('now'));
+        """,
+        (table_name, source_hash, table_hash),
+    )
+
+
+def database_file(db_cursor):
+    # empty for in-memory databases
+    return db_cursor.execute("PRAGMA database_list").fetchone()[2]
+
+
+class ReferenceCache:
+    """
+    In-process hash maps for small reference tables such as base_state.
+
+    Maps are keyed by database file and table, and versioned by the content
+    hash of the table itself. Callers pass the version they expect (for
+    base_state, the hash recorded when it was last published), and a cached
+    map is returned without reading the table as long as it matches.
+    """
+
+    def __init__(self):
+        self._lookups = {}
+
+    def lookup(self, db_cursor, table_name, key, value, version):
+        """
+        Return a ``{key: value}`` map of a reference table.
+
+        Args:
+            db_cursor: SQLite cursor
+            table_name: Reference table to read
+            key: Column used as the dict key
+            value: Column used as the dict value
+            version: Content hash of the table
+
+        Returns:
+            dict: The cached map, read from the table only if the version changed
+        """
+        db_file = database_file(db_cursor)
+        cache_key = (db_file, table_name, key, value)
+        cached = self._lookups.get(cache_key)
+        if cached is None or cached[0] != version:
+            rows = db_cursor.execute(f"SELECT {key}, {value} FROM {table_name}")
+            cached = (version, dict(rows.fetchall()))
+            # in-memory databases cannot be told apart, so they are never cached
+            if db_file:
+                self._lookups[cache_key] = cached
+        return cached[1]
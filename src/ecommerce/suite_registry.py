@@ -0,0 +1,110 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+DEFAULT_CONTEXT_ROOT_DIR = Path(__file__).parent / "gx"
+
+
+class SuiteNotFoundError(LookupError):
+    """Raised when an audit asks for an expectation suite that is not on disk."""
+
+
+@dataclass(frozen=True)
+class CompiledSuite:
+    """Parsed view of one expectation suite JSON file."""
+
+    name: str
+    asset: str
+    expectations: list = field(default_factory=list)
+    path: Path = None
+
+
+def compile_suite(path):
+    """
+    Parse an expectation suite file into a CompiledSuite.
+
+    The data asset defaults to the suite name (that is how the suites and the
+    ``ecommerce_db`` assets are paired in great_expectations.yml) and can be
+    overridden with ``meta.asset_name``.
+
+    Args:
+        path: Path to the ``<suite>.json`` file
+
+    Returns:
+        CompiledSuite: The compiled suite
+    """
+    with open(path) as f:
+        suite = json.load(f)
+
+    name = suite.get("expectation_suite_name") or path.stem
+    return CompiledSuite(
+        name=name,
+        asset=(suite.get("meta") or {}).get("asset_name", name),
+        expectations=suite.get("expectations", []),
+        path=path,
+    )
+
+
+class SuiteRegistry:
+    """
+    Index of every expectation suite under a GX context root.
+
+    Suites are parsed once and kept in memory; each lookup only stats the
+    expectations directory and re-parses the files whose mtime changed, so
+    edits to a suite are picked up without restarting the process.
+    """
+
+    def __init__(self, context_root_dir=None):
+        self.context_root_dir = Path(context_root_dir or DEFAULT_CONTEXT_ROOT_DIR)
+        self.expectations_dir = self.context_root_dir / "expectations"
+        self._index = {}
+        self._mtimes = {}
+
+    def refresh(self):
+        """
+        Re-parse added or modified suites and drop deleted ones.
+
+        Returns:
+            bool: True if the index changed
+        """
+        seen = {}
+        for path in self.expectations_dir.glob("*.json"):
+            seen[path] = path.stat().st_mtime_ns
+
+        changed = False
+        for path in set(self._mtimes) - set(seen):
+            self._index = {k: v for k, v in self._index.items() if v.path != path}
+            changed = True
+
+        for path, mtime in seen.items():
+            if self._mtimes.get(path) != mtime:
+                suite = compile_suite(path)
+                self._index = {k: v for k, v in self._index.items() if v.path != path}
+                self._index[suite.name] = suite
+                changed = True
+
+        self._mtimes = seen
+        return changed
+
+    def get(self, suite_name):
+        """
+        Look up a compiled suite by name.
+
+        Raises:
+            SuiteNotFoundError: If no suite with that name exists
+        """
+        self.refresh()
+        try:
+            return self._index[suite_name]
+        except KeyError:
+            raise SuiteNotFoundError(
+                f"No expectation suite named '{suite_name}' in {self.expectations_dir}"
+            ) from None
+
+    def names(self):
+        self.refresh()
+        return sorted(self._index)
+
+    def __contains__(self, suite_name):
+        self.refresh()
+        return suite_name in self._index
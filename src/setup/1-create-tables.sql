@@ -76,3 +76,27 @@ CREATE TABLE non_validated_dim_customer (
     datetime_updated DATETIME,
     etl_inserted DATETIME
 );
+
+-- create etl_reference_version
+CREATE TABLE etl_reference_version (
+    table_name TEXT PRIMARY KEY,
+    source_hash TEXT,
+    content_hash TEXT,
+    etl_inserted DATETIME
+);
+
+-- create dq_column_stats
+CREATE TABLE dq_column_stats (
+    run_id TEXT,
+    table_name TEXT,
+    column_name TEXT,
+    row_count INTEGER,
+    null_count INTEGER,
+    distinct_estimate INTEGER,
+    distinct_exact BOOLEAN,
+    min_value,
+    max_value,
+    length_histogram TEXT,
+    sample TEXT,
+    etl_inserted DATETIME
+);
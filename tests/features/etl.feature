@@ -15,4 +15,47 @@ Feature: ETL Process for Customer Data
         When I check the data quality
         Then all state codes should be valid
         And there should be no null values in customer data
-        And the data should be consistent with source tables 
\ No newline at end of file
+        And the data should be consistent with source tables 
+
+    Scenario: Expectation Suite Registry
+        Given the expectation suite registry is loaded
+        Then every non_validated table should have an expectation suite
+
+    Scenario: Column Statistics Collection
+        Given the ETL process is ready to run
+        When I execute the ETL process with column statistics
+        Then column statistics should be stored for every non_validated table
+        And the stored column statistics should match the seeded data
+
+    Scenario: Column Statistics For A Failed Run
+        Given the ETL process is ready to run
+        And raw_state is empty
+        When I execute the ETL process with column statistics and it fails
+        Then column statistics should be stored for the failed run
+
+    Scenario: Audits Answered From Column Statistics
+        Given customers are written to staging with column statistics
+        Then the stats-based audit should match Great Expectations
+        And a failing expectation should be caught from column statistics
+        And staging rows the stats did not see should fall back to Great Expectations
+
+    Scenario: Reference Data Versioning
+        Given the ETL process is ready to run
+        When I execute the ETL process twice
+        Then the base_state audit and publish should be skipped
+        When a state is renamed in raw_state and I execute the ETL process again
+        Then the base_state audit and publish should run
+        When I execute the ETL process again
+        Then the base_state audit and publish should be skipped
+
+    Scenario: Reference Data Cache Across Databases
+        Given the ETL process is ready to run
+        When I execute the ETL process with column statistics
+        And the database is re-initialised with a renamed state
+        And I execute the ETL process with column statistics
+        Then dim_customer state names should match base_state
+
+    Scenario: Unknown State Codes
+        Given the ETL process is ready to run
+        And a staged customer has a state_code missing from base_state
+        Then the unknown state_code should be reported
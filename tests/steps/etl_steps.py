@@ -8,8 +8,12 @@ from allure_behave.hooks import allure_report
 
 # Add the parent directory to the path so we can import the ETL module
 sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.ecommerce import dim_customer_etl
 from src.ecommerce.dim_customer_etl import run
+from src.ecommerce.column_stats import RunStats, validate_from_stats
 from src.ecommerce.init_db import init_db
+from src.ecommerce.suite_registry import CompiledSuite
+from src.ecommerce.suite_registry import SuiteRegistry
 
 def write_allure_report(test_name, status, description, steps, attachments=None):
     """Write a simple Allure report"""
@@ -256,6 +260,404 @@ def step_impl(context):
     
     record_step(context, 'Checking data consistency', check_data_consistency)
 
+@given('the expectation suite registry is loaded')
+def step_impl(context):
+    context.test_name = "Expectation Suite Registry"
+    context.steps = []
+    context.attachments = []
+
+    def load_registry():
+        context.suite_registry = SuiteRegistry()
+        return context.suite_registry.names()
+
+    record_step(context, 'Loading expectation suites', load_registry)
+
+@then('every non_validated table should have an expectation suite')
+def step_impl(context):
+    def check_suite_coverage():
+        conn = sqlite3.connect('data/ecommerce.db')
+        db_cursor = conn.cursor()
+
+        db_cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'non_validated_%'")
+        tables = [row[0] for row in db_cursor.fetchall()]
+        missing = [table for table in tables if table not in context.suite_registry]
+
+        context.attachments.append({
+            'name': 'Tables Without Suites',
+            'type': 'text',
+            'content': ", ".join(missing) or "none"
+        })
+
+        conn.close()
+        if missing:
+            raise Exception(f"No expectation suite for: {', '.join(missing)}")
+        return True
+
+    record_step(context, 'Checking suite coverage', check_suite_coverage)
+
+@when('I execute the ETL process with column statistics')
+def step_impl(context):
+    def execute_etl_with_stats():
+        run(collect_stats=True)
+        return True
+
+    record_step(context, 'Running ETL process with column statistics', execute_etl_with_stats)
+
+def run_recording_base_state_steps(context):
+    """Run the ETL and record whether the base_state audit and publish ran"""
+    audit, publish_base_state = dim_customer_etl.audit, dim_customer_etl.publish_base_state
+    calls = []
+
+    def recording_audit(expectation_suite_to_check, *args, **kwargs):
+        if expectation_suite_to_check == 'non_validated_base_state':
+            calls.append('audit')
+        return audit(expectation_suite_to_check, *args, **kwargs)
+
+    def recording_publish_base_state(db_cursor):
+        calls.append('publish')
+        return publish_base_state(db_cursor)
+
+    dim_customer_etl.audit = recording_audit
+    dim_customer_etl.publish_base_state = recording_publish_base_state
+    try:
+        run()
+    finally:
+        dim_customer_etl.audit = audit
+        dim_customer_etl.publish_base_state = publish_base_state
+    context.base_state_calls = calls
+    return calls
+
+@when('I execute the ETL process twice')
+def step_impl(context):
+    def execute_etl_twice():
+        run()
+        return run_recording_base_state_steps(context)
+
+    record_step(context, 'Running ETL process twice', execute_etl_twice)
+
+@when('a state is renamed in raw_state and I execute the ETL process again')
+def step_impl(context):
+    def rename_state_and_execute_etl():
+        conn = sqlite3.connect('data/ecommerce.db')
+        conn.execute("UPDATE raw_state SET state_name = 'State of Texas' WHERE state_code = 'TX'")
+        conn.commit()
+        conn.close()
+        return run_recording_base_state_steps(context)
+
+    record_step(context, 'Renaming a state and running ETL process', rename_state_and_execute_etl)
+
+@when('I execute the ETL process again')
+def step_impl(context):
+    def execute_etl_again():
+        return run_recording_base_state_steps(context)
+
+    record_step(context, 'Running ETL process again', execute_etl_again)
+
+@then('the base_state audit and publish should be skipped')
+def step_impl(context):
+    def check_base_state_skipped():
+        context.attachments.append({
+            'name': 'base_state Steps',
+            'type': 'text',
+            'content': ", ".join(context.base_state_calls) or "none"
+        })
+        if context.base_state_calls:
+            raise Exception(f"base_state steps ran on unchanged raw_state: {context.base_state_calls}")
+        return True
+
+    record_step(context, 'Checking base_state was skipped', check_base_state_skipped)
+
+@then('the base_state audit and publish should run')
+def step_impl(context):
+    def check_base_state_ran():
+        context.attachments.append({
+            'name': 'base_state Steps',
+            'type': 'text',
+            'content': ", ".join(context.base_state_calls) or "none"
+        })
+        if context.base_state_calls != ['audit', 'publish']:
+            raise Exception(f"Expected base_state audit and publish, got: {context.base_state_calls}")
+        return True
+
+    record_step(context, 'Checking base_state was audited and published', check_base_state_ran)
+
+@then('column statistics should be stored for every non_validated table')
+def step_impl(context):
+    def check_column_stats():
+        conn = sqlite3.connect('data/ecommerce.db')
+        db_cursor = conn.cursor()
+
+        db_cursor.execute("""
+            SELECT table_name, COUNT(*), MAX(row_count)
+            FROM dq_column_stats
+            GROUP BY table_name
+        """)
+        stats = {row[0]: row[1:] for row in db_cursor.fetchall()}
+
+        context.attachments.append({
+            'name': 'Column Stats',
+            'type': 'text',
+            'content': "\n".join(f"{table}: {columns} columns, {rows} rows" for table, (columns, rows) in stats.items())
+        })
+
+        conn.close()
+        expected = {'non_validated_base_customer', 'non_validated_base_state', 'non_validated_dim_customer'}
+        missing = expected - set(stats)
+        if missing:
+            raise Exception(f"No column statistics for: {', '.join(sorted(missing))}")
+        return True
+
+    record_step(context, 'Checking column statistics', check_column_stats)
+
+def fetch_column_stats(db_cursor, table_name):
+    db_cursor.execute("""
+        SELECT column_name, row_count, null_count, distinct_estimate, distinct_exact, min_value, max_value, length_histogram
+        FROM dq_column_stats
+        WHERE table_name = ?
+        ORDER BY etl_inserted DESC, rowid DESC
+    """, (table_name,))
+    stats = {}
+    for row in db_cursor.fetchall():
+        stats.setdefault(row[0], row[1:])
+    return stats
+
+@then('the stored column statistics should match the seeded data')
+def step_impl(context):
+    def check_column_stat_values():
+        conn = sqlite3.connect('data/ecommerce.db')
+        db_cursor = conn.cursor()
+        customer_stats = fetch_column_stats(db_cursor, 'non_validated_base_customer')
+        dim_stats = fetch_column_stats(db_cursor, 'non_validated_dim_customer')
+        conn.close()
+
+        context.attachments.append({
+            'name': 'Customer Column Stats',
+            'type': 'text',
+            'content': json.dumps(customer_stats, indent=2)
+        })
+
+        # (row_count, null_count, distinct_estimate, distinct_exact, min_value, max_value, length_histogram)
+        expected = {
+            'customer_id': (3, 0, 3, 1, 1, 3, None),
+            'zipcode': (3, 0, 3, 1, '10001', '90001', '{"5": 3}'),
+            'state_code': (3, 0, 3, 1, 'CA', 'TX', '{"2": 3}'),
+            'datetime_created': (3, 0, 3, 1, '2023-01-01', '2023-01-03', '{"10": 3}'),
+        }
+        for column, values in expected.items():
+            if customer_stats.get(column) != values:
+                raise Exception(f"Unexpected stats for {column}: {customer_stats.get(column)} != {values}")
+        if dim_stats.get('state_name', (None, None))[1] != 0:
+            raise Exception(f"Unexpected state_name null count: {dim_stats.get('state_name')}")
+        return True
+
+    record_step(context, 'Checking column statistic values', check_column_stat_values)
+
+@given('raw_state is empty')
+def step_impl(context):
+    def empty_raw_state():
+        conn = sqlite3.connect('data/ecommerce.db')
+        conn.execute("DELETE FROM raw_state")
+        conn.commit()
+        conn.close()
+        return True
+
+    record_step(context, 'Emptying raw_state', empty_raw_state)
+
+@when('I execute the ETL process with column statistics and it fails')
+def step_impl(context):
+    def execute_failing_etl_with_stats():
+        try:
+            run(collect_stats=True)
+        except SystemExit:
+            return True
+        raise Exception("ETL process did not fail on an empty raw_state")
+
+    record_step(context, 'Running failing ETL process with column statistics', execute_failing_etl_with_stats)
+
+@then('column statistics should be stored for the failed run')
+def step_impl(context):
+    def check_failed_run_stats():
+        conn = sqlite3.connect('data/ecommerce.db')
+        db_cursor = conn.cursor()
+        customer_stats = fetch_column_stats(db_cursor, 'non_validated_base_customer')
+        state_stats = fetch_column_stats(db_cursor, 'non_validated_base_state')
+        conn.close()
+
+        if customer_stats.get('customer_id', (None,))[0] != 3:
+            raise Exception(f"Missing base_customer stats for the failed run: {customer_stats}")
+        if state_stats.get('state_code', (None,))[0] != 0:
+            raise Exception(f"Missing base_state stats for the failed run: {state_stats}")
+        return True
+
+    record_step(context, 'Checking failed run column statistics', check_failed_run_stats)
+
+@given('customers are written to staging with column statistics')
+def step_impl(context):
+    context.test_name = "Audits Answered From Column Statistics"
+    context.steps = []
+    context.attachments = []
+
+    def write_customers_with_stats():
+        init_db()
+        conn = sqlite3.connect('data/ecommerce.db')
+        context.run_stats = RunStats()
+        dim_customer_etl.write_non_validated_base_customer(conn.cursor(), context.run_stats)
+        conn.commit()
+        conn.close()
+        return True
+
+    record_step(context, 'Writing customers with column statistics', write_customers_with_stats)
+
+@then('the stats-based audit should match Great Expectations')
+def step_impl(context):
+    def compare_with_gx():
+        stats_results = dim_customer_etl.audit('non_validated_base_customer', context.run_stats)
+        gx_results = dim_customer_etl.audit('non_validated_base_customer')
+        if stats_results[0].get('meta', {}).get('source') != 'column_stats':
+            raise Exception("Audit was not answered from column statistics")
+
+        def outcomes(validation_results):
+            return sorted(
+                (
+                    result.get('expectation_config').get('expectation_type'),
+                    str(result.get('expectation_config').get('kwargs').get('column')),
+                    result.get('success'),
+                )
+                for validation_result in validation_results
+                for result in validation_result.get('results', [])
+            )
+
+        context.attachments.append({
+            'name': 'Stats vs GX Outcomes',
+            'type': 'text',
+            'content': f"stats: {outcomes(stats_results)}\ngx: {outcomes(gx_results)}"
+        })
+        if outcomes(stats_results) != outcomes(gx_results):
+            raise Exception("Stats-based audit disagrees with Great Expectations")
+        return True
+
+    record_step(context, 'Comparing stats-based audit with GX', compare_with_gx)
+
+@then('a failing expectation should be caught from column statistics')
+def step_impl(context):
+    def check_failing_expectation():
+        suite = CompiledSuite(
+            name='zipcode_length',
+            asset='non_validated_base_customer',
+            expectations=[{
+                'expectation_type': 'expect_column_value_lengths_to_be_between',
+                'kwargs': {'column': 'zipcode', 'min_value': 4, 'max_value': 4},
+                'meta': {'level': 'ERROR'},
+            }],
+        )
+        validation_results = validate_from_stats(suite, context.run_stats.get('non_validated_base_customer'))
+        if validation_results is None:
+            raise Exception("Expectation was not answered from column statistics")
+        if dim_customer_etl.check_audit_failures(validation_results):
+            raise Exception("5 character zipcodes passed a length 4 expectation")
+        return True
+
+    record_step(context, 'Checking failing expectation from stats', check_failing_expectation)
+
+@then('staging rows the stats did not see should fall back to Great Expectations')
+def step_impl(context):
+    def check_partial_fallback():
+        conn = sqlite3.connect('data/ecommerce.db')
+        db_cursor = conn.cursor()
+        run_stats = RunStats()
+        # the rows from the previous write are still staged
+        dim_customer_etl.write_non_validated_base_customer(db_cursor, run_stats)
+        table_stats = run_stats.get('non_validated_base_customer')
+        suite = dim_customer_etl.suite_registry.get('non_validated_base_customer')
+        fallback = validate_from_stats(suite, table_stats) is None
+        db_cursor.execute("DELETE FROM non_validated_base_customer")
+        conn.commit()
+        conn.close()
+
+        if not table_stats.partial or not fallback:
+            raise Exception("Stats that missed staged rows were used to answer the audit")
+        return True
+
+    record_step(context, 'Checking partial stats fall back to GX', check_partial_fallback)
+
+@when('the database is re-initialised with a renamed state')
+def step_impl(context):
+    def reinitialise_with_renamed_state():
+        init_db()
+        conn = sqlite3.connect('data/ecommerce.db')
+        conn.execute("UPDATE raw_state SET state_name = 'State of Texas' WHERE state_code = 'TX'")
+        conn.commit()
+        conn.close()
+        return True
+
+    record_step(context, 'Re-initialising database with a renamed state', reinitialise_with_renamed_state)
+
+@then('dim_customer state names should match base_state')
+def step_impl(context):
+    def check_state_names():
+        conn = sqlite3.connect('data/ecommerce.db')
+        db_cursor = conn.cursor()
+
+        db_cursor.execute("""
+            SELECT dc.customer_id, dc.state_name, bs.state_name
+            FROM dim_customer dc
+            INNER JOIN base_state bs ON dc.state_code = bs.state_code
+            WHERE dc.state_name != bs.state_name
+        """)
+        mismatches = db_cursor.fetchall()
+
+        context.attachments.append({
+            'name': 'State Name Mismatches',
+            'type': 'text',
+            'content': str(mismatches)
+        })
+
+        conn.close()
+        if mismatches:
+            raise Exception(f"dim_customer has stale state names: {mismatches}")
+        return True
+
+    record_step(context, 'Checking dim_customer state names', check_state_names)
+
+@given('a staged customer has a state_code missing from base_state')
+def step_impl(context):
+    def stage_unknown_state_customer():
+        run()
+        conn = sqlite3.connect('data/ecommerce.db')
+        db_cursor = conn.cursor()
+        db_cursor.execute("""
+            INSERT INTO raw_customer (customer_id, zipcode, city, state_code, datetime_created, datetime_updated)
+            VALUES (4, '99501', 'Anchorage', 'AK', '2023-01-04', '2023-01-04')
+        """)
+        dim_customer_etl.write_non_validated_base_customer(db_cursor)
+        conn.commit()
+        conn.close()
+        return True
+
+    record_step(context, 'Staging a customer with an unknown state code', stage_unknown_state_customer)
+
+@then('the unknown state_code should be reported')
+def step_impl(context):
+    def check_unknown_state_codes():
+        conn = sqlite3.connect('data/ecommerce.db')
+        db_cursor = conn.cursor()
+        state_names = dim_customer_etl.load_state_names(db_cursor)
+        unknown_codes = dim_customer_etl.unknown_state_codes(db_cursor, state_names)
+        db_cursor.execute("DELETE FROM non_validated_base_customer")
+        conn.commit()
+        conn.close()
+
+        context.attachments.append({
+            'name': 'Unknown State Codes',
+            'type': 'text',
+            'content': str(unknown_codes)
+        })
+        if unknown_codes != {'AK': 1}:
+            raise Exception(f"Expected AK to be reported as unknown, got: {unknown_codes}")
+        return True
+
+    record_step(context, 'Checking unknown state codes', check_unknown_state_codes)
+
 def after_scenario(context, scenario):
     """Generate report after each scenario"""
     if hasattr(context, 'test_name'):